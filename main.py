@@ -1,28 +1,60 @@
 import logging
 import uvicorn
 import os
-from datetime import datetime
+import uuid
+import orjson
+import asyncio
+import aiofiles
+from contextlib import asynccontextmanager
+from anyio import to_thread
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from typing import Optional
 from pydantic import BaseModel
-from openai import OpenAI
+from cachetools import TTLCache
 
 # Load Environment Variables
 load_dotenv()
 
 # Imports from your src
-from src.intent_classifier import classify_intent
-from src.handlers import handle_live_weather, handle_theory
+from src.handlers import route_query, handle_live_weather, stream_live_weather, handle_theory, openai_client, weather_agent
+from src.cache import cache_stats
+from src.http_client import warm_up, close_shared_client
+from src.intent_classifier import start_intent_batcher, stop_intent_batcher
+from src.summary_batcher import SUMMARY_MODEL, build_summary_messages, append_summary, enqueue_summary, run_summary_batcher
 
 # Setup Logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize OpenAI Client
-openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Remaining blocking work (SQLite summary queue, sync dependencies) runs in anyio's worker threads;
+# we size that pool explicitly instead of relying on the default of 40.
+THREAD_LIMIT = int(os.getenv("THREAD_LIMIT", 32))
 
-app = FastAPI()
+# Start the weather lookup for the session's last city while routing is still running.
+# Hides the routing latency on follow-ups ("and tomorrow?"), but costs an extra lookup when the guess is wrong.
+PREFETCH_WEATHER = os.getenv("PREFETCH_WEATHER", "false").lower() == "true"
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    to_thread.current_default_thread_limiter().total_tokens = THREAD_LIMIT
+    await start_intent_batcher()
+    await weather_agent.start()
+    await warm_up(openai_client)
+    summary_batcher = asyncio.create_task(run_summary_batcher(openai_client))
+    yield
+    summary_batcher.cancel()
+    try:
+        await summary_batcher  # Lets it release claimed rows before the clients close
+    except asyncio.CancelledError:
+        pass
+    await stop_intent_batcher()
+    await weather_agent.close()
+    await close_shared_client()
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # --- CORS SETUP ---
 # Added localhost so you can still test locally against the live backend
@@ -34,84 +66,175 @@ origins = [
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # Allows all domains (Change to your specific Vercel URL later for security)
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_origins=origins,
+    allow_credentials=False,  # The API uses no cookies or auth headers
+    allow_methods=["GET", "POST"],
+    allow_headers=["Content-Type"],
+    max_age=600,  # Let browsers cache the preflight for 10 minutes
 )
 # --- MODELS ---
 class ChatRequest(BaseModel):
     query: str
+    session_id: Optional[str] = None # Clients that don't send one get no follow-up memory
 
 class SummaryRequest(BaseModel):
     messages: list[dict] # List of {"role": "user/bot", "content": "..."}
 
+class BatchSummaryItem(SummaryRequest):
+    custom_id: str # Stable id (e.g. session id) used to skip already-summarized sessions when a run is retried
+
+# Older turns beyond this are left out of /summary prompts
+SUMMARY_MAX_TURNS = 50
+
+# /summary/batch progress files (one per run, one JSON line per finished session) and parallelism
+SUMMARY_CHECKPOINT_DIR = "summary_checkpoints"
+SUMMARY_BATCH_CONCURRENCY = 5
+RUN_ID_PATTERN = r"^[A-Za-z0-9_-]{1,64}$"  # Used as a file name, so no dots or slashes
+
 # --- 🧠 MEMORY STORAGE ---
-user_session = {
-    "last_city": None
-}
+# Keyed per session so users don't overwrite each other's city; idle sessions expire after 30 min.
+# This lives in process memory: run a single worker until it moves to a shared store (e.g. Redis),
+# otherwise a follow-up landing on another worker loses its city.
+sessions: TTLCache = TTLCache(maxsize=100_000, ttl=1800)
+
+def get_last_city(session_id: Optional[str]):
+    if not session_id:
+        return None  # Anonymous requests never share a memory slot
+    return sessions.get(session_id, {}).get("last_city")
+
+def set_last_city(session_id: Optional[str], city: str):
+    if session_id:
+        sessions[session_id] = {"last_city": city}
+
+NO_CITY_MESSAGE = "I couldn't identify a specific city. Which city are you asking about?"
+
+async def resolve_route(request: ChatRequest):
+    """
+    Routes the query and applies session memory. Returns (routed, final_city).
+    """
+    # One Gemini call decides the route and, for theory, already carries the answer
+    routed = await route_query(request.query)
+    detected_city = routed.get("city")
+
+    # Context Memory Logic
+    if detected_city and detected_city != "NULL":
+        set_last_city(request.session_id, detected_city)
+        final_city = detected_city
+    else:
+        final_city = get_last_city(request.session_id)
+
+    return routed, final_city
+
+def enhance_query(user_query: str, final_city: str) -> str:
+    # Inject memory into query
+    return user_query if final_city.lower() in user_query.lower() else f"{user_query} in {final_city}"
 
 @app.post("/chat")
 async def chat_endpoint(request: ChatRequest):
     user_query = request.query
     logger.info(f"Received query: {user_query}")
 
+    last_city = get_last_city(request.session_id)
+    prefetch = None
+    if PREFETCH_WEATHER and last_city:
+        prefetch = asyncio.create_task(
+            handle_live_weather(query=enhance_query(user_query, last_city), city=last_city)
+        )
+
     try:
-        intent_data = classify_intent(user_query)
-        intent = intent_data.get("intent")
-        detected_city = intent_data.get("city")
-
-        # Context Memory Logic
-        if detected_city and detected_city != "NULL":
-            user_session["last_city"] = detected_city
-            final_city = detected_city
-        else:
-            final_city = user_session["last_city"]
+        routed, final_city = await resolve_route(request)
 
-        if intent == "weather":
+        if routed.get("intent") == "weather":
             if not final_city:
-                return {"response": "I couldn't identify a specific city. Which city are you asking about?", "source": "System"}
+                return {"response": NO_CITY_MESSAGE, "source": "System"}
             
-            # Inject memory into query
-            enhanced_query = user_query if final_city.lower() in user_query.lower() else f"{user_query} in {final_city}"
-            response_text = handle_live_weather(query=enhanced_query, city=final_city)
+            if prefetch and final_city == last_city:
+                # The speculative lookup was for the right city: reuse it
+                response_text = await prefetch
+            else:
+                enhanced_query = enhance_query(user_query, final_city)
+                response_text = await handle_live_weather(query=enhanced_query, city=final_city)
             return {"response": response_text, "source": "Live Weather API"}
             
         else:
-            response = handle_theory(user_query)
+            response = handle_theory(routed)
             return {"response": response, "source": "Knowledge Base (PDF)"}
 
     except Exception as e:
         logger.error(f"Error processing request: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if prefetch and not prefetch.done():
+            prefetch.cancel()
+
+async def _single_chunk(text: str):
+    yield text
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest):
+    """
+    Same as /chat, but streams the answer as Server-Sent Events so the first tokens arrive early.
+    Each event is {"delta": "...", "source": "..."}; the stream ends with "[DONE]".
+    """
+    user_query = request.query
+    logger.info(f"Received streaming query: {user_query}")
+
+    try:
+        routed, final_city = await resolve_route(request)
+    except Exception as e:
+        logger.error(f"Error processing request: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if routed.get("intent") == "weather":
+        if not final_city:
+            source, chunks = "System", _single_chunk(NO_CITY_MESSAGE)
+        else:
+            source = "Live Weather API"
+            chunks = stream_live_weather(query=enhance_query(user_query, final_city), city=final_city)
+    else:
+        # The Gemini answer is already complete, so it goes out as a single event
+        source, chunks = "Knowledge Base (PDF)", _single_chunk(handle_theory(routed))
+
+    async def event_stream():
+        try:
+            async for chunk in chunks:
+                yield f"data: {orjson.dumps({'delta': chunk, 'source': source}).decode()}\n\n"
+        except Exception as e:
+            logger.error(f"Streaming error: {e}")
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+def history_text(messages: list[dict]) -> str:
+    # Only the most recent turns, to cap token usage
+    return "\n".join(f"{m['role']}: {m['content']}" for m in messages[-SUMMARY_MAX_TURNS:])
+
+async def summarize(messages: list[dict]) -> str:
+    # Generate a concise, fluff-free summary
+    response = await openai_client.chat.completions.create(
+        model=SUMMARY_MODEL,
+        messages=build_summary_messages(history_text(messages)),
+        temperature=0.3
+    )
+    return response.choices[0].message.content
 
 @app.post("/summary")
-async def save_summary(request: SummaryRequest):
+async def save_summary(request: SummaryRequest, realtime: bool = False):
     """
-    Generates a 2-sentence summary of the session and saves it to a local file.
+    Queues a 2-sentence summary of the session for the OpenAI Batch API; it is appended to
+    chat_summaries.txt once the batch completes. Pass ?realtime=true to summarize and save immediately.
     """
     if not request.messages or len(request.messages) <= 1:
         return {"summary": "No significant conversation to summarize."}
     
-    # 1. Prepare history for the LLM
-    history_text = "\n".join([f"{m['role']}: {m['content']}" for m in request.messages])
-    
     try:
-        # 2. Generate a concise, fluff-free summary
-        response = openai_client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a professional scribe. Summarize the following chat in exactly 2 sentences. Focus on locations and technical topics mentioned. No preamble."},
-                {"role": "user", "content": history_text}
-            ],
-            temperature=0.3
-        )
-        summary = response.choices[0].message.content
-        
-        # 3. Save to a file
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        with open("chat_summaries.txt", "a") as f:
-            f.write(f"[{timestamp}]\n{summary}\n{'='*30}\n")
+        if not realtime:
+            summary_id = await enqueue_summary(history_text(request.messages))
+            logger.info(f"🕒 Conversation summary queued ({summary_id}).")
+            return {"summary": None, "status": "queued", "id": summary_id}
+
+        summary = await summarize(request.messages)
+        await append_summary(summary)
             
         logger.info("✅ Conversation summary saved.")
         return {"summary": summary}
@@ -119,7 +242,86 @@ async def save_summary(request: SummaryRequest):
         logger.error(f"Summary Error: {e}")
         raise HTTPException(status_code=500, detail="Failed to save summary")
 
+def summary_checkpoint_path(run_id: str) -> str:
+    return os.path.join(SUMMARY_CHECKPOINT_DIR, f"{run_id}.jsonl")
+
+async def load_summary_checkpoint(path: str) -> dict:
+    """
+    Reads {custom_id: summary} for every session already written to this run's checkpoint.
+    """
+    if not os.path.exists(path):
+        return {}
+    done = {}
+    async with aiofiles.open(path, "r") as f:
+        async for line in f:
+            try:
+                record = orjson.loads(line)
+                done[record["custom_id"]] = record["summary"]
+            except (orjson.JSONDecodeError, KeyError):
+                continue  # Torn last line from a crash: that session gets redone
+    return done
+
+@app.post("/summary/batch")
+async def save_summary_batch(
+    items: list[BatchSummaryItem],
+    run_id: Optional[str] = Query(None, pattern=RUN_ID_PATTERN)
+):
+    """
+    Summarizes many sessions (e.g. a nightly job). Every finished summary is appended to the run's
+    checkpoint right away, so re-sending the same batch with the returned run_id after a crash only
+    redoes the missing ids. A new run (no run_id) always summarizes from scratch.
+    """
+    run_id = run_id or uuid.uuid4().hex
+    checkpoint = summary_checkpoint_path(run_id)
+
+    # Duplicate custom_ids in one request are summarized once (first occurrence wins)
+    unique = {}
+    for item in items:
+        unique.setdefault(item.custom_id, item)
+    items = list(unique.values())
+
+    done = await load_summary_checkpoint(checkpoint)
+    results = {item.custom_id: done[item.custom_id] for item in items if item.custom_id in done}
+    pending = [item for item in items if item.custom_id not in results]
+    failed = []
+
+    semaphore = asyncio.Semaphore(SUMMARY_BATCH_CONCURRENCY)
+    write_lock = asyncio.Lock()
+
+    os.makedirs(SUMMARY_CHECKPOINT_DIR, exist_ok=True)
+    async with aiofiles.open(checkpoint, "a") as f:
+        async def process(item: BatchSummaryItem):
+            if len(item.messages) <= 1:
+                summary = "No significant conversation to summarize."
+            else:
+                try:
+                    async with semaphore:
+                        summary = await summarize(item.messages)
+                except Exception as e:
+                    logger.error(f"Summary Error ({item.custom_id}): {e}")
+                    failed.append(item.custom_id)
+                    return
+            async with write_lock:
+                await f.write(orjson.dumps({"custom_id": item.custom_id, "summary": summary}).decode() + "\n")
+                await f.flush()
+            results[item.custom_id] = summary
+
+        await asyncio.gather(*(process(item) for item in pending))
+
+    logger.info(f"✅ Batch summary {run_id}: {len(pending) - len(failed)} new, {len(items) - len(pending)} resumed, {len(failed)} failed.")
+    return {"run_id": run_id, "summaries": results, "failed": failed}
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """
+    Debug endpoint: size and hit/miss counters of the in-process LLM caches.
+    """
+    return cache_stats()
+
 if __name__ == "__main__":
     # RAILWAY UPDATE: Railway dynamically assigns a port. We must catch it here.
     port = int(os.environ.get("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
\ No newline at end of file
+    # One worker by default: session memory is per-process (see `sessions`). Raise WEB_CONCURRENCY only
+    # once sessions live in a shared store. uvloop + httptools cut per-request overhead.
+    workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+    uvicorn.run("main:app", host="0.0.0.0", port=port, workers=workers, loop="uvloop", http="httptools")
\ No newline at end of file
@@ -0,0 +1,137 @@
+import os
+import hashlib
+import logging
+import diskcache
+from anyio import to_thread
+from cachetools import LRUCache, TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Every cache registers itself here so /cache/stats can report on all of them
+_caches = {}
+
+# On-disk tier of LLMCache, shared by all workers and kept across restarts
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", ".llm_cache")
+
+def query_key(query: str) -> str:
+    """
+    Normalizes the query (trim + lowercase) and hashes it into a compact cache key.
+    """
+    return hashlib.blake2b(query.strip().lower().encode("utf-8"), digest_size=16).hexdigest()
+
+class QueryCache:
+    """
+    Bounded LRU + TTL cache for LLM results, keyed on the normalized query text.
+    Reads and writes never await, so it is safe to share between coroutines on one event loop.
+    """
+    def __init__(self, name: str, maxsize: int = 1024, ttl: int = 3600):
+        self.name = name
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+        _caches[name] = self
+
+    def get(self, query: str):
+        value = self._cache.get(query_key(query))
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, query: str, value) -> None:
+        self._cache[query_key(query)] = value
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._cache),
+            "maxsize": self._cache.maxsize,
+            "ttl": self._cache.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+def content_key(*parts: str) -> str:
+    """
+    SHA-256 over length-prefixed parts, so ("ab", "c") and ("a", "bc") never collide.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        data = part.encode("utf-8")
+        digest.update(len(data).to_bytes(8, "big"))
+        digest.update(data)
+    return digest.hexdigest()
+
+class LLMCache:
+    """
+    Content-addressed cache for LLM outputs: an in-memory LRU in front of a diskcache store.
+    Callers build the key with content_key(model, prompt_version, input...).
+    The disk tier is SQLite shared by all workers, so async code must use aget/aset,
+    which run it in a worker thread instead of blocking the event loop.
+    """
+    def __init__(self, name: str, maxsize: int = 4096, expire: int = 86400):
+        self.name = name
+        self.expire = expire
+        self._memory = LRUCache(maxsize=maxsize)
+        self._disk = diskcache.Cache(os.path.join(LLM_CACHE_DIR, name))
+        self.hits = 0
+        self.misses = 0
+        _caches[name] = self
+
+    def get(self, key: str):
+        value = self._memory.get(key)
+        if value is None:
+            value = self._promote(key, self._disk_get(key))
+        return self._count(value)
+
+    def set(self, key: str, value) -> None:
+        self._memory[key] = value
+        self._disk_set(key, value)
+
+    async def aget(self, key: str):
+        value = self._memory.get(key)
+        if value is None:
+            value = self._promote(key, await to_thread.run_sync(self._disk_get, key))
+        return self._count(value)
+
+    async def aset(self, key: str, value) -> None:
+        self._memory[key] = value
+        await to_thread.run_sync(self._disk_set, key, value)
+
+    # A locked disk tier (another worker writing) degrades to a miss / memory-only write, never an error
+    def _disk_get(self, key: str):
+        try:
+            return self._disk.get(key)
+        except diskcache.Timeout:
+            logger.warning(f"LLM cache '{self.name}' disk read timed out")
+            return None
+
+    def _disk_set(self, key: str, value) -> None:
+        try:
+            self._disk.set(key, value, expire=self.expire)
+        except diskcache.Timeout:
+            logger.warning(f"LLM cache '{self.name}' disk write timed out")
+
+    def _promote(self, key: str, value):
+        if value is not None:
+            self._memory[key] = value  # Promote disk hits
+        return value
+
+    def _count(self, value):
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._memory),
+            "maxsize": self._memory.maxsize,
+            "disk_size": len(self._disk),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+def cache_stats() -> dict:
+    return {name: cache.stats() for name, cache in _caches.items()}
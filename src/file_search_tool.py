@@ -1,18 +1,52 @@
 import os
+import re
+import orjson
 import logging
+from typing import Literal, Optional
 from google import genai
 from google.genai import types
 from dotenv import load_dotenv
+from pydantic import BaseModel
+from src.cache import QueryCache
+from src.http_client import shared_http_client
 
 load_dotenv()
 logger = logging.getLogger(__name__)
 
+class RoutedAnswer(BaseModel):
+    """Structured output of the single routing + RAG call."""
+    intent: Literal["weather", "theory"]
+    city: Optional[str] = None
+    answer: str = ""
+
+# One prompt does the job of the old GPT-4o classifier AND the GPT-4o-mini synthesis step
+SYSTEM_PROMPT = (
+    "You are the Routing Brain and Weather Intelligence Expert for a Weather AI. "
+    "Analyze the user query and return JSON with 'intent', 'city' and 'answer'.\n\n"
+    "RULES:\n"
+    "1. intent 'weather': current/future conditions, forecasts, or city-specific weather checks.\n"
+    "2. intent 'theory': scientific definitions, greetings, or 'how it works' questions.\n"
+    "3. city: the city name if present; otherwise null.\n"
+    "4. answer: for 'theory', answer using ONLY the retrieved research documents. If the answer "
+    "is NOT in them, say: 'I'm sorry, my current documents do not contain information on that "
+    "specific topic.' Keep it professional, under 4 sentences, and do not mention 'chunks' or "
+    "'files'. For 'weather', leave answer empty."
+)
+
+# Built once at import; the greeting check runs before every search
+_GREETINGS = frozenset({"hi", "hello", "hey", "hola", "namaste", "thanks", "thank you", "bye", "good morning"})
+_PUNCT = re.compile(r"[!.?,]")
+
+# Repeated concept questions ("What is a cyclone?") skip Gemini entirely
+_answer_cache = QueryCache("gemini_search")
+
 class GeminiFileSearch:
     """
     Smart Knowledge Base Tool:
     1. Handles Greetings LOCALLY (Zero API Cost).
     2. Uses 'gemini-3-flash-preview' for RAG (Newer model, separate quota).
-    3. Falls back to Chat Mode if RAG fails.
+       The same call also routes the query (intent + city) and writes the final answer.
+    3. On failure returns a canned answer with intent=None (no second LLM call).
     """
     def __init__(self):
         self.api_key = os.getenv("GEMINI_API_KEY")
@@ -21,58 +55,78 @@ class GeminiFileSearch:
         if not self.api_key:
             logger.error("❌ GEMINI_API_KEY is missing")
         
-        self.client = genai.Client(api_key=self.api_key)
+        # Async calls share the app-wide HTTP/2 pool with the OpenAI clients
+        self.client = genai.Client(
+            api_key=self.api_key,
+            http_options=types.HttpOptions(httpx_async_client=shared_http_client)
+        )
         
         # ✅ SWITCHED to a Preview model to bypass current rate limits
         # You do NOT need to recreate your database/store.
         self.model_id = "gemini-3-flash-preview"
 
-    def search(self, query: str):
+    async def search(self, query: str) -> dict:
         """
         Main function to handle Theory/Concepts.
+        Returns {"intent": ..., "city": ..., "answer": ...} from a single Gemini call.
+        "intent" is None if Gemini failed and the query still needs routing.
         """
         # --- ⚡️ LEVEL 1: ZERO-COST LOCAL GREETINGS ---
-        greetings = ["hi", "hello", "hey", "hola", "namaste", "thanks", "thank you", "bye", "good morning"]
-        cleaned_query = query.strip().lower().replace("!", "").replace(".", "")
-        
-        if cleaned_query in greetings:
+        if _PUNCT.sub("", query.strip().lower()) in _GREETINGS:
             logger.info(f"⚡ Handling greeting locally: {query}")
-            return "Hello! 👋 I am your Weather Intelligence Assistant. Ask me for a **Forecast** (e.g., 'London Weather') or a **Concept** (e.g., 'What is a cyclone?')."
+            return self._theory("Hello! 👋 I am your Weather Intelligence Assistant. Ask me for a **Forecast** (e.g., 'London Weather') or a **Concept** (e.g., 'What is a cyclone?').")
+
+        cached = _answer_cache.get(query)
+        if cached is not None:
+            logger.info(f"♻️ Cache hit for: '{query}'")
+            return cached
 
-        # --- 🔍 LEVEL 2: INTELLIGENT SEARCH ---
+        if not self.store_id:
+            logger.error("❌ GEMINI_STORE_ID is missing")
+            return self._unrouted("My knowledge base is not configured right now. Please try again later.")
+
+        # --- 🔍 LEVEL 2: INTELLIGENT SEARCH (RAG) ---
         try:
-            # Try Document Search (RAG)
-            if self.store_id:
-                logger.info(f"🔍 RAG Search for: '{query}' using {self.model_id}")
-                try:
-                    response = self.client.models.generate_content(
-                        model=self.model_id,
-                        contents=query,
-                        config=types.GenerateContentConfig(
-                            tools=[
-                                types.Tool(
-                                    file_search=types.FileSearch(
-                                        file_search_store_names=[self.store_id]
-                                    )
-                                )
-                            ]
-                        )
-                    )
-                    return response.text
-                except Exception as rag_error:
-                    logger.warning(f"⚠️ RAG Search failed ({rag_error}). Switching to Chat Mode.")
-            
-            # --- 💬 LEVEL 3: FALLBACK CHAT ---
-            logger.info(f"💬 Chat Mode for: '{query}'")
-            response = self.client.models.generate_content(
+            logger.info(f"🔍 RAG Search for: '{query}' using {self.model_id}")
+            response = await self.client.aio.models.generate_content(
                 model=self.model_id,
-                contents=f"You are a helpful weather assistant. User says: {query}",
-                config=types.GenerateContentConfig()
+                contents=query,
+                config=types.GenerateContentConfig(
+                    system_instruction=SYSTEM_PROMPT,
+                    response_mime_type="application/json",
+                    response_schema=RoutedAnswer,
+                    tools=[
+                        types.Tool(
+                            file_search=types.FileSearch(
+                                file_search_store_names=[self.store_id]
+                            )
+                        )
+                    ]
+                )
             )
-            return response.text
+            result = self._parse(response)
+            _answer_cache.set(query, result)
+            return result
 
         except Exception as e:
+            # No second Gemini call here: on a 429 it would only hit the same exhausted quota
             logger.error(f"❌ Gemini Critical Error: {e}")
             if "429" in str(e):
-                return "⚠️ **System Overload:** I'm receiving too many requests right now. Please wait 1 minute and try again!"
-            return "I'm having trouble connecting to my knowledge base right now. Please try again later."
\ No newline at end of file
+                return self._unrouted("⚠️ **System Overload:** I'm receiving too many requests right now. Please wait 1 minute and try again!")
+            return self._unrouted("I'm having trouble connecting to my knowledge base right now. Please try again later.")
+
+    @staticmethod
+    def _theory(answer: str) -> dict:
+        return {"intent": "theory", "city": None, "answer": answer}
+
+    @staticmethod
+    def _unrouted(answer: str) -> dict:
+        # intent=None tells the caller Gemini could not route this query
+        return {"intent": None, "city": None, "answer": answer}
+
+    @staticmethod
+    def _parse(response) -> dict:
+        if isinstance(response.parsed, RoutedAnswer):
+            return response.parsed.model_dump()
+        # Schema parsing can be skipped when tools are attached; fall back to the raw JSON text
+        return RoutedAnswer.model_validate(orjson.loads(response.text)).model_dump()
\ No newline at end of file
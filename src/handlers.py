@@ -1,64 +1,57 @@
+import asyncio
 import logging
 import os
-from openai import OpenAI
-from src.weather_api_client import WeatherAPIClient
+from openai import AsyncOpenAI
+from src.weather_api_client import AsyncWeatherAPIClient
 from src.file_search_tool import GeminiFileSearch
+from src.intent_classifier import classify_intent
+from src.http_client import shared_http_client
 
 logger = logging.getLogger(__name__)
 
 # Initialize Clients
-weather_agent = WeatherAPIClient()
+openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=shared_http_client)
+weather_agent = AsyncWeatherAPIClient(openai_client=openai_client)
 gemini_tool = GeminiFileSearch()
-openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-def handle_live_weather(query: str = "", city: str = None):
-    input_text = query if query else str(city)
-    return weather_agent.get_weather(input_text)
-
-def handle_theory(user_query: str):
-    # 1. Local Greeting Check (The Fix)
-    greetings = ["hi", "hello", "hey", "hola"]
-    if user_query.lower().strip() in greetings:
-        return "Hello! I'm your Weather Intelligence Bot. Ask me about a city's forecast or a climate concept from your docs."
+# How long we wait on the combined Gemini call before falling back to the GPT classifier
+GEMINI_TIMEOUT = 20  # seconds
 
-    # 2. Proceed to PDF Search if not a greeting
-    raw_knowledge = gemini_tool.search(user_query) 
-    
-    if not raw_knowledge:
-        return "I couldn't find any information on that topic in my knowledge base."
-
-    return generate_summarized_response(user_query, [raw_knowledge])
+async def handle_live_weather(query: str = "", city: str = None):
+    input_text = query if query else str(city)
+    return await weather_agent.get_weather(input_text)
 
-# ... (existing imports)
+async def stream_live_weather(query: str = "", city: str = None):
+    input_text = query if query else str(city)
+    async for chunk in weather_agent.stream_weather(input_text):
+        yield chunk
 
-def generate_summarized_response(user_query, retrieved_chunks):
+async def route_query(user_query: str) -> dict:
     """
-    Synthesizes a response grounded strictly in the retrieved PDF context.
+    Classifies the query AND answers it from the PDFs in one Gemini round trip.
+    Falls back to the GPT classifier for routing if Gemini times out or fails.
+    Returns {"intent": "weather"|"theory", "city": str|None, "answer": str}.
     """
-    raw_context = "\n---\n".join(retrieved_chunks)
-    
-    # IMPROVED SYSTEM PROMPT: Focuses on grounding and avoiding hallucinations
-    system_prompt = (
-        "You are a Weather Intelligence Expert. Your goal is to answer questions "
-        "using ONLY the provided context from research documents. \n\n"
-        "RULES:\n"
-        "1. If the answer is NOT in the context, say: 'I'm sorry, my current documents "
-        "do not contain information on that specific topic.'\n"
-        "2. Do not use outside knowledge.\n"
-        "3. Keep the tone professional and the answer concise (under 4 sentences).\n"
-        "4. Do not mention 'chunks' or 'files'."
-    )
-
+    # 1. Single Gemini call: intent + city + grounded answer (greetings are answered locally inside)
     try:
-        response = openai_client.chat.completions.create(
-            model="gpt-4o-mini", # Use mini for faster, cheaper synthesis
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"CONTEXT:\n{raw_context}\n\nUSER QUESTION: {user_query}"}
-            ],
-            temperature=0.2 # Lower temperature = higher factual accuracy
-        )
-        return response.choices[0].message.content
-    except Exception as e:
-        logger.error(f"Synthesis Error: {e}")
-        return "I had trouble processing that document search."
\ No newline at end of file
+        routed = await asyncio.wait_for(gemini_tool.search(user_query), timeout=GEMINI_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning(f"⏱️ Gemini timed out after {GEMINI_TIMEOUT}s. Falling back to GPT routing.")
+        routed = {
+            "intent": None,
+            "city": None,
+            "answer": "My knowledge base is taking too long to respond. Please try again in a moment."
+        }
+
+    if routed.get("intent") is None:
+        # 2. Gemini failed: only route with GPT so weather queries still work
+        intent_data = await classify_intent(user_query)
+        routed = {**routed, "intent": intent_data.get("intent"), "city": intent_data.get("city")}
+
+    return routed
+
+def handle_theory(routed: dict) -> str:
+    """
+    Returns Gemini's grounded answer directly (no second synthesis call).
+    """
+    return routed.get("answer") or "I couldn't find any information on that topic in my knowledge base."
@@ -0,0 +1,26 @@
+import logging
+import httpx
+from openai import DefaultAsyncHttpxClient
+
+logger = logging.getLogger(__name__)
+
+# One connection pool for every outbound LLM call (OpenAI + Gemini).
+# HTTP/2 multiplexes concurrent requests over a single TLS connection per host,
+# and the raised limits stop bursts from queueing on the SDK defaults.
+shared_http_client = DefaultAsyncHttpxClient(
+    limits=httpx.Limits(max_connections=200, max_keepalive_connections=100),
+    http2=True
+)
+
+async def warm_up(openai_client):
+    """
+    Opens the first connection at startup so the first user request skips the TLS handshake.
+    """
+    try:
+        await openai_client.with_options(timeout=5, max_retries=0).models.list()
+        logger.info("🔥 OpenAI connection pool warmed up")
+    except Exception as e:
+        logger.warning(f"⚠️ Connection warm-up failed: {e}")
+
+async def close_shared_client():
+    await shared_http_client.aclose()
@@ -0,0 +1,215 @@
+import os
+import uuid
+import asyncio
+import logging
+import sqlite3
+import time
+import orjson
+import aiofiles
+from datetime import datetime
+from anyio import to_thread
+
+logger = logging.getLogger(__name__)
+
+# Summaries are archival, so by default they go through OpenAI's Batch API (half price, up to 24h turnaround)
+SUMMARY_MODEL = "gpt-4o-mini"
+SUMMARY_SYSTEM_PROMPT = "You are a professional scribe. Summarize the following chat in exactly 2 sentences. Focus on locations and technical topics mentioned. No preamble."
+SUMMARY_FILE = "chat_summaries.txt"
+
+QUEUE_DB = os.getenv("SUMMARY_QUEUE_DB", "summary_queue.db")
+BATCH_INTERVAL = int(os.getenv("SUMMARY_BATCH_INTERVAL", 600))  # seconds between flush/poll rounds
+STALE_CLAIM_AFTER = 3600  # seconds; claims left behind by a crashed worker go back to pending
+
+def build_summary_messages(history_text: str) -> list:
+    return [
+        {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+        {"role": "user", "content": history_text}
+    ]
+
+async def append_summary(summary: str, timestamp: str = None):
+    timestamp = timestamp or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    async with aiofiles.open(SUMMARY_FILE, "a") as f:
+        await f.write(f"[{timestamp}]\n{summary}\n{'='*30}\n")
+
+# --- 🗄️ SQLITE QUEUE (sync; always called through a worker thread) ---
+# Row lifecycle: batch_id NULL (pending) -> "claim-..." (uploading) -> OpenAI batch id (submitted) -> deleted (saved)
+
+def _connect():
+    conn = sqlite3.connect(QUEUE_DB, timeout=30)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS pending_summaries ("
+        "id TEXT PRIMARY KEY, history TEXT NOT NULL, created_at TEXT NOT NULL, batch_id TEXT, claimed_at REAL)"
+    )
+    return conn
+
+def _enqueue(history_text: str) -> str:
+    summary_id = uuid.uuid4().hex
+    with _connect() as conn:
+        conn.execute(
+            "INSERT INTO pending_summaries (id, history, created_at) VALUES (?, ?, ?)",
+            (summary_id, history_text, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        )
+    return summary_id
+
+def _claim_pending(claim: str) -> list:
+    # The UPDATE is atomic, so concurrent workers never upload the same row twice
+    with _connect() as conn:
+        conn.execute("UPDATE pending_summaries SET batch_id = ?, claimed_at = ? WHERE batch_id IS NULL", (claim, time.time()))
+        return conn.execute("SELECT id, history FROM pending_summaries WHERE batch_id = ?", (claim,)).fetchall()
+
+def _set_batch(old_batch_id: str, new_batch_id) -> int:
+    with _connect() as conn:
+        return conn.execute(
+            "UPDATE pending_summaries SET batch_id = ?, claimed_at = ? WHERE batch_id = ?",
+            (new_batch_id, time.time(), old_batch_id)
+        ).rowcount
+
+def _release_stale_claims():
+    with _connect() as conn:
+        conn.execute(
+            "UPDATE pending_summaries SET batch_id = NULL WHERE batch_id LIKE 'claim-%' AND claimed_at < ?",
+            (time.time() - STALE_CLAIM_AFTER,)
+        )
+
+def _submitted_batches() -> list:
+    with _connect() as conn:
+        rows = conn.execute(
+            "SELECT DISTINCT batch_id FROM pending_summaries WHERE batch_id IS NOT NULL AND batch_id NOT LIKE 'claim-%'"
+        ).fetchall()
+    return [row[0] for row in rows]
+
+def _rows_for_batch(batch_id: str) -> dict:
+    with _connect() as conn:
+        rows = conn.execute("SELECT id, created_at FROM pending_summaries WHERE batch_id = ?", (batch_id,)).fetchall()
+    return dict(rows)
+
+def _delete_saved(batch_id: str, summary_id: str):
+    with _connect() as conn:
+        conn.execute("DELETE FROM pending_summaries WHERE batch_id = ? AND id = ?", (batch_id, summary_id))
+
+def _requeue_batch(batch_id: str) -> int:
+    with _connect() as conn:
+        return conn.execute(
+            "UPDATE pending_summaries SET batch_id = NULL, claimed_at = NULL WHERE batch_id = ?", (batch_id,)
+        ).rowcount
+
+async def enqueue_summary(history_text: str) -> str:
+    return await to_thread.run_sync(_enqueue, history_text)
+
+# --- 📦 BATCH API ROUND TRIP ---
+
+async def submit_pending(openai_client):
+    """
+    Uploads every pending summary as one JSONL file and starts a Batch API job for it.
+    """
+    claim = f"claim-{uuid.uuid4().hex}"
+    try:
+        rows = await to_thread.run_sync(_claim_pending, claim)
+    except asyncio.CancelledError:
+        # The claim may have committed in its worker thread before the cancellation landed
+        await to_thread.run_sync(_set_batch, claim, None)
+        raise
+    if not rows:
+        return
+
+    lines = (
+        orjson.dumps({
+            "custom_id": summary_id,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {"model": SUMMARY_MODEL, "messages": build_summary_messages(history), "temperature": 0.3}
+        })
+        for summary_id, history in rows
+    )
+    try:
+        batch_file = await openai_client.files.create(
+            file=("summaries.jsonl", b"\n".join(lines)),
+            purpose="batch"
+        )
+        batch = await openai_client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+    except Exception as e:
+        logger.error(f"Summary batch upload failed: {e}")
+        await to_thread.run_sync(_set_batch, claim, None)  # Back to pending for the next round
+        return
+    except asyncio.CancelledError:
+        # Shutting down mid-upload: release the rows (off the event loop) before exiting
+        await to_thread.run_sync(_set_batch, claim, None)
+        raise
+
+    await to_thread.run_sync(_set_batch, claim, batch.id)
+    logger.info(f"📦 Submitted {len(rows)} summaries as batch {batch.id}")
+
+async def collect_finished(openai_client):
+    """
+    Appends the results of finished batches to the summaries file and re-queues whatever they did not return.
+    """
+    for batch_id in await to_thread.run_sync(_submitted_batches):
+        try:
+            await _collect_batch(openai_client, batch_id)
+        except Exception as e:
+            # One bad batch must not hold up the others (or this round's submit)
+            logger.error(f"Summary batch {batch_id} collection failed: {e}")
+
+async def _collect_batch(openai_client, batch_id: str):
+    batch = await openai_client.batches.retrieve(batch_id)
+    if batch.status not in ("completed", "failed", "expired", "cancelled"):
+        return
+    if batch.status != "completed":
+        # Expired and cancelled batches can still carry partial output; save it before re-queueing the rest
+        logger.warning(f"⚠️ Summary batch {batch_id} {batch.status}. Re-queueing unfinished summaries.")
+
+    created = await to_thread.run_sync(_rows_for_batch, batch_id)
+    # Claim the batch before writing, so a second worker polling the same batch skips it
+    collecting = f"claim-{uuid.uuid4().hex}"
+    if not await to_thread.run_sync(_set_batch, batch_id, collecting):
+        return
+
+    try:
+        saved = await _save_batch_output(openai_client, batch, collecting, created)
+    except BaseException:
+        # Hand the batch back (including on shutdown) so the next round collects it instead of
+        # the stale-claim sweep re-submitting it; rows already saved are gone, so nothing is written twice
+        await to_thread.run_sync(_set_batch, collecting, batch_id)
+        raise
+
+    requeued = await to_thread.run_sync(_requeue_batch, collecting)
+    logger.info(f"✅ Saved {saved} summaries from batch {batch_id}, re-queued {requeued}")
+
+async def _save_batch_output(openai_client, batch, collecting: str, created: dict) -> int:
+    saved = 0
+    if batch.output_file_id:
+        output = await openai_client.files.content(batch.output_file_id)
+        for line in output.text.splitlines():
+            record = orjson.loads(line)
+            body = (record.get("response") or {}).get("body") or {}
+            summary_id = record.get("custom_id")
+            if summary_id in created and body.get("choices"):
+                await append_summary(body["choices"][0]["message"]["content"], created[summary_id])
+                # Deleted one by one, so a retry after a failure further down never appends it again
+                await to_thread.run_sync(_delete_saved, collecting, summary_id)
+                saved += 1
+
+    if batch.error_file_id:
+        errors = await openai_client.files.content(batch.error_file_id)
+        for line in errors.text.splitlines():
+            record = orjson.loads(line)
+            error = (record.get("response") or {}).get("body", {}).get("error") or record.get("error")
+            logger.warning(f"⚠️ Summary {record.get('custom_id')} failed in batch {batch.id}: {error}")
+    return saved
+
+async def run_summary_batcher(openai_client):
+    """
+    Background loop (started from the app lifespan): poll finished batches, then flush new ones.
+    """
+    while True:
+        try:
+            await to_thread.run_sync(_release_stale_claims)
+            await collect_finished(openai_client)
+            await submit_pending(openai_client)
+        except Exception as e:
+            logger.error(f"Summary batcher error: {e}")
+        await asyncio.sleep(BATCH_INTERVAL)
@@ -1,16 +1,196 @@
 import os
-import json
+import re
+import sys
+import hashlib
 import logging
-from typing import Dict, Any, Optional, Tuple
+import asyncio
+from typing import Dict, Any, AsyncIterator, Iterator, List, Optional, Tuple
 from enum import Enum
 
-import requests
+import aiohttp
+import orjson
 from dotenv import load_dotenv
-from openai import OpenAI
+from pydantic import BaseModel, Field
+
+try:
+    import hyperscan  # Optional: single-pass multi-pattern city scan
+except ImportError:
+    hyperscan = None
+
+# openai is imported where it is first used, keeping it off the import path of callers that pass their own client
+from src.cache import LLMCache, QueryCache, content_key, query_key
 
 load_dotenv()
 logger = logging.getLogger(__name__)
 
+# Content-addressed LLM caches: a repeated query (or the same query against the same data) skips the API call
+_extraction_cache = LLMCache("extraction")
+_response_cache = LLMCache("response")
+
+# WeatherAPI refreshes roughly every 15 minutes, so repeat fetches within 10 minutes reuse the cleaned data
+WEATHER_CACHE_TTL = 600  # seconds
+_weather_cache = QueryCache("weather", maxsize=1024, ttl=WEATHER_CACHE_TTL)
+
+# Cheap local city guess ("weather in London today" -> "London") used to start the HTTP fetch early
+_QUICK_CITY_RE = re.compile(
+    r"\b(?:in|for|at)\s+([A-Za-z ]+?)(?:\s+(?:today|tomorrow|next|this)|\?|$)",
+    re.IGNORECASE
+)
+
+# Extraction fast path: a query that is exactly "<weather word> in/for/at <city> [time phrase]"
+# is parsed locally when <city> is a known name; anything else goes to the LLM
+_QUERY_RE = re.compile(
+    r"^\s*(?:(?:what(?:'s| is)|how(?:'s| is))\s+(?:the\s+)?)?"
+    r"(?:weather|temperature|temp|forecast|rain|climate)\s+(?:in|for|at)\s+"
+    r"([a-z][a-z .'-]*?)"
+    r"(?:\s+(?:today|tomorrow|now|right now|this week|next week|next few days|coming days))?"
+    r"\s*[?.!]*\s*$",
+    re.IGNORECASE
+)
+_FORECAST_WORDS = frozenset({"forecast", "week", "coming", "next", "tomorrow"})
+# An explicit day count ("next 5 days", "two day forecast") is left to the LLM
+_NUMBER_WORDS = frozenset({
+    "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten",
+    "couple", "fortnight",
+})
+# Time words _fast_days cannot turn into a day count ("this weekend", "on Sunday") are left to the LLM too
+_UNHANDLED_TIME_WORDS = frozenset({
+    "monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday",
+    "weekend", "month", "year",
+})
+# Words that may follow a scanned city name; anything else ("Paris Texas", "London Eye") may
+# qualify it, so the query goes to the LLM
+_CITY_FOLLOWERS = frozenset({
+    "today", "tomorrow", "tonight", "now", "right", "this", "next", "later", "and", "for", "on",
+    "weather", "forecast", "temperature", "temp", "rain", "raining", "humidity", "climate",
+})
+# Common misspellings / old names -> standard names (same corrections the extraction prompt asks for)
+_CITY_ALIASES: Dict[str, str] = {
+    "banglore": "Bengaluru",
+    "bangalore": "Bengaluru",
+    "newyork": "New York",
+    "nyc": "New York",
+    "madhurai": "Madurai",
+    "dilli": "Delhi",
+    "bombay": "Mumbai",
+    "calcutta": "Kolkata",
+    "madras": "Chennai",
+}
+# Cities recognized anywhere in a query ("can I play cricket in London?") when the template misses.
+# Only unambiguous names: no cities that double as common English words.
+_KNOWN_CITIES = (
+    "London", "Paris", "New York", "Los Angeles", "Chicago", "San Francisco", "Toronto",
+    "Mexico City", "Sao Paulo", "Buenos Aires", "Madrid", "Lisbon", "Rome", "Berlin",
+    "Amsterdam", "Vienna", "Moscow", "Istanbul", "Cairo", "Lagos", "Nairobi", "Dubai",
+    "Delhi", "Mumbai", "Bengaluru", "Chennai", "Kolkata", "Hyderabad", "Pune", "Madurai",
+    "Mangalore", "Bangkok", "Singapore", "Jakarta", "Beijing", "Shanghai", "Hong Kong",
+    "Seoul", "Tokyo", "Sydney",
+)
+# Lowercased name or alias -> standard name
+_CITY_NAMES: Dict[str, str] = {
+    **{city.lower(): city for city in _KNOWN_CITIES},
+    **_CITY_ALIASES,
+}
+
+
+class _CityScanner:
+    """
+    Finds known city names (and aliases) anywhere in a query in one pass.
+    
+    Uses a Hyperscan database when the hyperscan package is installed, so scan time
+    does not grow with the number of names; otherwise one compiled regex alternation.
+    """
+
+    def __init__(self, names: Dict[str, str]):
+        self._canonical = list(names.values())
+        patterns = [r"\b" + re.escape(name) + r"\b" for name in names]
+        if hyperscan is not None:
+            self._db = hyperscan.Database()
+            self._db.compile(
+                expressions=[pattern.encode() for pattern in patterns],
+                ids=list(range(len(patterns))),
+                flags=[hyperscan.HS_FLAG_CASELESS] * len(patterns)
+            )
+            self._regex = None
+        else:
+            self._db = None
+            # One group per name, so a match maps back by group index rather than by its
+            # (case-folded) text. Longest first, so "new york" wins over any shorter name it contains.
+            order = sorted(range(len(patterns)), key=lambda i: len(patterns[i]), reverse=True)
+            self._group_names = [self._canonical[i] for i in order]
+            self._regex = re.compile(
+                "|".join(f"({patterns[i]})" for i in order),
+                re.IGNORECASE
+            )
+
+    def scan(self, text: str) -> Dict[str, List[int]]:
+        """Map the canonical name of every known city mentioned in text to the end offsets of its mentions."""
+        found: Dict[str, List[int]] = {}
+        if self._db is not None:
+            encoded = text.encode()
+
+            def on_match(pattern_id: int, start: int, end: int, flags: int, context: Any) -> None:
+                offset = len(encoded[:end].decode(errors="ignore"))
+                found.setdefault(self._canonical[pattern_id], []).append(offset)
+
+            self._db.scan(encoded, match_event_handler=on_match)
+            return found
+        for match in self._regex.finditer(text):
+            found.setdefault(self._group_names[match.lastindex - 1], []).append(match.end())
+        return found
+
+
+_city_scanner = _CityScanner(_CITY_NAMES)
+
+# Field tables for _clean_weather_data: (output key, WeatherAPI key, format or None to keep the raw value)
+_FieldTable = Tuple[Tuple[str, str, Optional[str]], ...]
+
+_CURRENT_FIELDS: _FieldTable = (
+    ("temp", "temp_c", "{}°C"),
+    ("feels_like", "feelslike_c", "{}°C"),
+    ("wind", "wind_kph", "{} kph"),
+    ("wind_direction", "wind_dir", None),
+    ("humidity", "humidity", "{}%"),
+    ("cloud_cover", "cloud", "{}%"),
+    ("uv_index", "uv", None),
+)
+_DAY_FIELDS: _FieldTable = (
+    ("max_temp", "maxtemp_c", "{}°C"),
+    ("min_temp", "mintemp_c", "{}°C"),
+    ("avg_temp", "avgtemp_c", "{}°C"),
+    ("rain_chance", "daily_chance_of_rain", "{}%"),
+    ("max_wind", "maxwind_kph", "{} kph"),
+)
+
+
+# The cleaning helpers below are plain, fully annotated module-level functions so they
+# stay cheap to call and can be compiled (e.g. with mypyc) without touching the client class
+
+def _extract_fields(fields: _FieldTable, source: Dict[str, Any]) -> Dict[str, Any]:
+    """Walk a field table once over a WeatherAPI section ("N/A" for missing keys)."""
+    return {
+        out_key: source.get(src_key, "N/A") if fmt is None else fmt.format(source.get(src_key, "N/A"))
+        for out_key, src_key, fmt in fields
+    }
+
+
+def _condition_text(section: Dict[str, Any]) -> str:
+    return section.get("condition", {}).get("text", "N/A")
+
+
+def _clean_current(current_data: Dict[str, Any]) -> Dict[str, Any]:
+    current = _extract_fields(_CURRENT_FIELDS, current_data)
+    current["condition"] = _condition_text(current_data)
+    return current
+
+
+def _clean_forecast_day(day: Dict[str, Any]) -> Dict[str, Any]:
+    day_data: Dict[str, Any] = day.get("day", {})
+    cleaned_day = _extract_fields(_DAY_FIELDS, day_data)
+    cleaned_day["date"] = day.get("date", "N/A")
+    cleaned_day["condition"] = _condition_text(day_data)
+    return cleaned_day
+
 
 class WeatherQueryType(Enum):
     """Enumeration for different types of weather queries."""
@@ -24,7 +204,14 @@ class WeatherAPIError(Exception):
     pass
 
 
-class WeatherAPIClient:
+class Extraction(BaseModel):
+    """Structured output of the city/days extraction call (schema enforced server-side)."""
+    # No defaults: strict structured outputs require every field
+    city: Optional[str]
+    days: int = Field(ge=1)  # Upper bound is clamped to MAX_FORECAST_DAYS, not rejected
+
+
+class AsyncWeatherAPIClient:
     """
     Client for fetching and processing weather data with LLM integration.
     
@@ -32,20 +219,44 @@ class WeatherAPIClient:
     1. Uses LLM to extract and correct city names from  language queries
     2. Fetches weather data from WeatherAPI.comnatural
     3. Uses LLM to generate natural, conversational responses
+    
+    Non-blocking: one reusable aiohttp session for WeatherAPI.com and AsyncOpenAI for the
+    LLM steps, so many queries can overlap on a single event loop. Synchronous callers
+    use the WeatherAPIClient wrapper.
     """
     
     # API Configuration
-    BASE_URL = "http://api.weatherapi.com/v1/forecast.json"
+    BASE_URL = "https://api.weatherapi.com/v1/forecast.json"
     REQUEST_TIMEOUT = 10  # seconds
+    # Retries on transient gateway errors
+    MAX_RETRIES = 2
+    RETRY_BACKOFF = 0.2  # seconds, doubled per attempt
+    RETRY_STATUSES = (502, 503, 504)
     DEFAULT_DAYS = 1
+    # WeatherAPI returns 24 hourly entries per forecast day unless one hour is requested;
+    # _clean_weather_data never uses them, so ask for a single one (cuts the payload ~10x)
+    FORECAST_HOUR = 12
     MAX_FORECAST_DAYS = 7
+    # Days fetched speculatively; any extraction asking for <= this many days can reuse the result
+    SPECULATIVE_DAYS = 3
     
     # LLM Configuration
     LLM_MODEL = "gpt-4o"
+    EXTRACTION_MODEL = "gpt-4o-mini"  # City/days extraction does not need the full model
     LLM_TEMPERATURE = 0
+    PROMPT_VERSION = "2"  # Bump when a system prompt changes, so cached LLM outputs are not reused
     
-    # System prompts
-    EXTRACTION_SYSTEM_PROMPT = """
+    # User-facing messages
+    NO_CITY_MESSAGE = (
+        "I couldn't identify a city in your request. "
+        "Could you please specify the location? "
+        "For example: 'weather in London' or 'forecast for Paris'"
+    )
+    EMPTY_QUERY_MESSAGE = "Please ask me about the weather in a specific location."
+    EXTRACTION_FAILED_MESSAGE = "I'm having trouble understanding your query. Could you rephrase it?"
+    
+    # System prompts (interned: every request shares the same string objects)
+    EXTRACTION_SYSTEM_PROMPT = sys.intern("""
 You are an intelligent entity extractor for weather queries.
 
 TASKS:
@@ -66,9 +277,9 @@ EXAMPLES:
 - "weather in banglore next week" → {"city": "Bengaluru", "days": 3}
 - "temperature in paris" → {"city": "Paris", "days": 1}
 - "forecast for newyork" → {"city": "New York", "days": 3}
-"""
+""")
 
-    RESPONSE_SYSTEM_PROMPT = """
+    RESPONSE_SYSTEM_PROMPT = sys.intern("""
 You are a friendly Weather Assistant.
 
 GUIDELINES:
@@ -85,21 +296,23 @@ RESPONSE STYLE:
 - Current weather: Brief and informative
 - Forecast: Highlight key changes or notable conditions
 - Activity advice: Clear recommendation with reasoning
-"""
+""")
 
     def __init__(
         self,
         weather_api_key: Optional[str] = None,
         openai_api_key: Optional[str] = None,
-        base_url: Optional[str] = None
+        base_url: Optional[str] = None,
+        openai_client: Optional[Any] = None
     ):
         """
-        Initialize the WeatherAPIClient.
+        Initialize the AsyncWeatherAPIClient.
         
         Args:
             weather_api_key: WeatherAPI.com API key. If None, loads from environment.
             openai_api_key: OpenAI API key. If None, loads from environment.
             base_url: Weather API base URL. If None, uses default.
+            openai_client: Existing AsyncOpenAI client to reuse. If None, one is created.
             
         Raises:
             ValueError: If required API keys are missing.
@@ -115,7 +328,7 @@ RESPONSE STYLE:
                 "Please set it in .env file or pass as argument."
             )
         
-        if not openai_key:
+        if not openai_key and openai_client is None:
             raise ValueError(
                 "❌ OPENAI_API_KEY is missing. "
                 "Please set it in .env file or pass as argument."
@@ -123,13 +336,223 @@ RESPONSE STYLE:
         
         # Initialize clients
         self.base_url = base_url or self.BASE_URL
-        self.openai_client = OpenAI(api_key=openai_key)
+        self.openai_client = openai_client or self._create_openai_client(openai_key)
+        self._http: Optional[aiohttp.ClientSession] = None
+        # Upstream fetches in progress, so concurrent queries for the same city share one request
+        self._inflight_fetches: Dict[str, asyncio.Task] = {}
+        # Whole-query pipelines in progress (single-flight for identical concurrent questions)
+        # and how many callers are awaiting each one
+        self._inflight_queries: Dict[str, asyncio.Task] = {}
+        self._query_waiters: Dict[asyncio.Task, int] = {}
+        
+        logger.info(f"✅ {type(self).__name__} initialized successfully")
+
+    def _create_openai_client(self, api_key: str):
+        from openai import AsyncOpenAI
+        return AsyncOpenAI(api_key=api_key)
+
+    # ------------------------------------------------------------------
+    # Pure helpers
+    # ------------------------------------------------------------------
+
+    def _extraction_messages(self, user_query: str) -> list:
+        return [
+            {"role": "system", "content": self.EXTRACTION_SYSTEM_PROMPT},
+            {"role": "user", "content": user_query}
+        ]
+
+    def _fast_extract(self, user_query: str) -> Optional[Tuple[str, int]]:
+        """
+        Parse simple "weather in <city>" queries without the LLM.
+        
+        Only captures that are a known city or alias are trusted; anything else
+        ("paris in fahrenheit", "the uk", "the London Eye") is left to the LLM.
+        
+        Returns:
+            Tuple of (city_name, days), or None if the query needs the LLM.
+        """
+        match = _QUERY_RE.match(user_query)
+        if not match:
+            return self._scan_extract(user_query)
+        
+        raw_city = " ".join(match.group(1).split()).strip(" .").lower()
+        city = _CITY_NAMES.get(raw_city) or _CITY_NAMES.get(raw_city.replace(" ", ""))
+        if city is None:
+            return self._scan_extract(user_query)
+        days = self._fast_days(user_query)
         
-        logger.info("✅ WeatherAPIClient initialized successfully")
+        logger.info(f"Fast-path extraction from '{user_query}': city={city}, days={days}")
+        return city, days
 
-    def _extract_location_and_days(self, user_query: str) -> Tuple[Optional[str], int]:
+    def _scan_extract(self, user_query: str) -> Optional[Tuple[str, int]]:
         """
-        Extract city name and forecast days from user query using LLM.
+        Fast path for free-form queries that mention exactly one known city.
+        
+        Queries with a day count, a named day ("on Sunday") or a qualified place
+        ("Paris, Texas") go to the LLM.
+        """
+        words = set(re.findall(r"[a-z]+", user_query.lower()))
+        if re.search(r"\d", user_query) or words & _NUMBER_WORDS or words & _UNHANDLED_TIME_WORDS:
+            return None
+        cities = _city_scanner.scan(user_query)
+        if len(cities) != 1:
+            return None  # No known city, or a comparison / follow-up naming several
+        
+        city, ends = cities.popitem()
+        for end in ends:
+            following = re.match(r"\s*(,|[^\W\d_]+)?", user_query[end:]).group(1)
+            if following is not None and following.lower() not in _CITY_FOLLOWERS:
+                return None
+        days = self._fast_days(user_query)
+        logger.info(f"Known-city extraction from '{user_query}': city={city}, days={days}")
+        return city, days
+
+    def _fast_days(self, user_query: str) -> int:
+        return 3 if _FORECAST_WORDS.intersection(re.findall(r"[a-z]+", user_query.lower())) else self.DEFAULT_DAYS
+
+    def _extraction_key(self, user_query: str) -> str:
+        return content_key(self.EXTRACTION_MODEL, self.PROMPT_VERSION, user_query.lower().strip())
+
+    def _response_key(self, user_query: str, weather_data: Dict[str, Any]) -> str:
+        data_hash = hashlib.sha256(orjson.dumps(weather_data, option=orjson.OPT_SORT_KEYS)).hexdigest()
+        return content_key(self.LLM_MODEL, self.PROMPT_VERSION, user_query, data_hash)
+
+    def _normalize_extraction(self, user_query: str, message: Any) -> Tuple[Optional[str], int]:
+        """
+        Normalize the parsed extraction from a structured-outputs response message.
+        
+        Raises:
+            WeatherAPIError: If the model refused or returned nothing parseable.
+        """
+        extraction: Optional[Extraction] = message.parsed
+        if extraction is None:
+            raise WeatherAPIError(f"No structured extraction returned (refusal: {message.refusal})")
+        
+        city = extraction.city
+        days = extraction.days
+        
+        # Validate and normalize
+        if city and city.upper() == "NULL":
+            city = None
+        
+        # Clamp days to valid range
+        days = min(days, self.MAX_FORECAST_DAYS)
+        
+        logger.info(f"Extracted from '{user_query}': city={city}, days={days}")
+        return city, days
+
+    @staticmethod
+    def _weather_cache_key(location: str, days: int) -> str:
+        return f"{location.strip().lower()}|{days}"
+
+    def _weather_params(self, location: str, days: int) -> Dict[str, Any]:
+        return {
+            "key": self.weather_api_key,
+            "q": location,
+            "days": days,
+            "aqi": "no",
+            "alerts": "no",
+            "hour": self.FORECAST_HOUR
+        }
+
+    def _status_error(self, status_code: int, location: str) -> Optional[Dict[str, Any]]:
+        """
+        Map WeatherAPI error status codes to a failed result, or None if not a known error.
+        """
+        if status_code == 400:
+            logger.warning(f"City not found: {location}")
+            return {"success": False, "error": "City not found"}
+        
+        if status_code == 401:
+            logger.error("Invalid Weather API key")
+            return {"success": False, "error": "API authentication failed"}
+        
+        if status_code == 403:
+            logger.error("Weather API access forbidden")
+            return {"success": False, "error": "API access denied"}
+        
+        return None
+
+    def _response_messages(self, user_query: str, weather_data: Dict[str, Any]) -> list:
+        prompt = (
+            f"User Query: {user_query}\n\n"
+            f"Weather Data: {orjson.dumps(weather_data).decode()}"  # Compact: indentation only costs tokens
+        )
+        return [
+            {"role": "system", "content": self.RESPONSE_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+
+    @staticmethod
+    def _basic_response(weather_data: Dict[str, Any]) -> str:
+        """Plain one-line answer used when the LLM response step fails."""
+        current = weather_data.get("current", {})
+        location = weather_data.get("location", "Unknown")
+        return f"Weather in {location}: {current.get('temp', 'N/A')}, {current.get('condition', 'N/A')}."
+
+    def _clean_weather_data(self, raw_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Clean and structure raw weather API response to reduce token usage.
+        
+        Args:
+            raw_data: Raw JSON response from WeatherAPI.com.
+            
+        Returns:
+            Cleaned and structured weather data.
+        """
+        location_data: Dict[str, Any] = raw_data.get("location", {})
+        forecast_data: List[Dict[str, Any]] = raw_data.get("forecast", {}).get("forecastday", [])
+        
+        return {
+            "location": f"{location_data.get('name', 'Unknown')}, "
+                       f"{location_data.get('country', 'Unknown')}",
+            "local_time": location_data.get("localtime", "N/A"),
+            "current": _clean_current(raw_data.get("current", {})),
+            "forecast": [_clean_forecast_day(day) for day in forecast_data]
+        }
+
+    @staticmethod
+    def _fetch_error_message(city: str, weather_result: Dict[str, Any]) -> str:
+        """Turn a failed fetch result into a user-facing message."""
+        error_msg = weather_result.get("error", "Unknown error")
+        
+        if "not found" in error_msg.lower():
+            return (
+                f"I couldn't find weather data for '{city}'. "
+                f"Please check the spelling or try a different location."
+            )
+        elif "authentication" in error_msg.lower() or "denied" in error_msg.lower():
+            return "I'm experiencing technical difficulties. Please try again later."
+        elif "timeout" in error_msg.lower():
+            return "The weather service is taking too long to respond. Please try again."
+        else:
+            return f"I encountered an issue: {error_msg}. Please try again."
+
+    @staticmethod
+    def _quick_city_guess(user_query: str) -> Optional[str]:
+        match = _QUICK_CITY_RE.search(user_query)
+        return match.group(1).strip() if match else None
+
+    # ------------------------------------------------------------------
+    # Pipeline
+    # ------------------------------------------------------------------
+
+    async def start(self) -> None:
+        """Open the HTTP session (call from the app lifespan)."""
+        if self._http is None or self._http.closed:
+            self._http = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=self.REQUEST_TIMEOUT)
+            )
+
+    async def close(self) -> None:
+        """Close the HTTP session (call on app shutdown)."""
+        if self._http is not None:
+            await self._http.close()
+            self._http = None
+
+    async def _extract_location_and_days(self, user_query: str) -> Tuple[Optional[str], int]:
+        """
+        Extract city name and forecast days from user query using the (smaller) extraction model.
         
         Args:
             user_query: Natural language query from user.
@@ -140,41 +563,34 @@ RESPONSE STYLE:
         Raises:
             WeatherAPIError: If extraction fails.
         """
+        cache_key = self._extraction_key(user_query)
+        cached = await _extraction_cache.aget(cache_key)
+        if cached is not None:
+            return cached
+        
         try:
-            response = self.openai_client.chat.completions.create(
-                model=self.LLM_MODEL,
-                messages=[
-                    {"role": "system", "content": self.EXTRACTION_SYSTEM_PROMPT},
-                    {"role": "user", "content": user_query}
-                ],
+            # Structured outputs: the server enforces the Extraction schema and the SDK returns the model
+            response = await self.openai_client.chat.completions.parse(
+                model=self.EXTRACTION_MODEL,
+                messages=self._extraction_messages(user_query),
                 temperature=self.LLM_TEMPERATURE,
-                response_format={"type": "json_object"}
+                response_format=Extraction
             )
             
-            extracted_data = json.loads(response.choices[0].message.content)
-            city = extracted_data.get("city")
-            days = extracted_data.get("days", self.DEFAULT_DAYS)
-            
-            # Validate and normalize
-            if city and city.upper() == "NULL":
-                city = None
-            
-            # Clamp days to valid range
-            days = max(1, min(days, self.MAX_FORECAST_DAYS))
-            
-            logger.info(f"Extracted from '{user_query}': city={city}, days={days}")
-            return city, days
+            result = self._normalize_extraction(user_query, response.choices[0].message)
+            await _extraction_cache.aset(cache_key, result)
+            return result
             
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse LLM extraction response: {e}")
-            raise WeatherAPIError("Failed to process your query") from e
         except Exception as e:
             logger.error(f"Extraction error: {e}")
             raise WeatherAPIError("Failed to understand your query") from e
 
-    def _fetch_raw_weather(self, location: str, days: int = 1) -> Dict[str, Any]:
+    async def _fetch_raw_weather(self, location: str, days: int = 1) -> Dict[str, Any]:
         """
-        Fetch raw weather data from WeatherAPI.com.
+        Fetch weather data, served from the short-TTL weather cache when fresh.
+        
+        On a cache miss, callers asking for the same (city, days) at the same time
+        await one shared upstream request.
         
         Args:
             location: City name or location query.
@@ -182,41 +598,59 @@ RESPONSE STYLE:
             
         Returns:
             Dictionary with 'success' key and either 'data' or 'error'.
+        """
+        cache_key = self._weather_cache_key(location, days)
+        cached = _weather_cache.get(cache_key)
+        if cached is not None:
+            return {"success": True, "data": cached}
+        
+        flight_key = query_key(cache_key)
+        task = self._inflight_fetches.get(flight_key)
+        if task is None:
+            task = asyncio.create_task(self._request_weather(location, days))
+            self._inflight_fetches[flight_key] = task
+            task.add_done_callback(lambda _: self._inflight_fetches.pop(flight_key, None))
+        
+        # Shielded: a cancelled caller (e.g. a dropped speculative fetch) must not cancel it for the others
+        weather_result = await asyncio.shield(task)
+        if weather_result.get("success"):
+            _weather_cache.set(cache_key, weather_result["data"])
+        return weather_result
+
+    async def _request_weather(self, location: str, days: int = 1) -> Dict[str, Any]:
+        """
+        Fetch raw weather data from WeatherAPI.com (uncached).
+        
+        Args:
+            location: City name or location query.
+            days: Number of forecast days (1-7).
             
-        Raises:
-            WeatherAPIError: If API request fails critically.
+        Returns:
+            Dictionary with 'success' key and either 'data' or 'error'.
         """
+        await self.start()
         try:
-            params = {
-                "key": self.weather_api_key,
-                "q": location,
-                "days": days,
-                "aqi": "no",
-                "alerts": "no"
-            }
-            
             logger.info(f"Fetching weather for {location} ({days} days)")
-            response = requests.get(
-                self.base_url,
-                params=params,
-                timeout=self.REQUEST_TIMEOUT
-            )
-            
-            # Handle specific error cases
-            if response.status_code == 400:
-                logger.warning(f"City not found: {location}")
-                return {"success": False, "error": "City not found"}
-            
-            if response.status_code == 401:
-                logger.error("Invalid Weather API key")
-                return {"success": False, "error": "API authentication failed"}
-            
-            if response.status_code == 403:
-                logger.error("Weather API access forbidden")
-                return {"success": False, "error": "API access denied"}
-            
-            response.raise_for_status()
-            raw_data = response.json()
+            for attempt in range(self.MAX_RETRIES + 1):
+                if attempt:
+                    await asyncio.sleep(self.RETRY_BACKOFF * 2 ** (attempt - 1))
+                async with self._http.get(
+                    self.base_url,
+                    params=self._weather_params(location, days)
+                ) as response:
+                    
+                    if response.status in self.RETRY_STATUSES and attempt < self.MAX_RETRIES:
+                        logger.warning(f"Weather API returned {response.status}, retrying")
+                        continue
+                    
+                    # Handle specific error cases
+                    error = self._status_error(response.status, location)
+                    if error:
+                        return error
+                    
+                    response.raise_for_status()
+                    raw_data = orjson.loads(await response.read())
+                    break
             
             # Transform to clean structure
             cleaned_data = self._clean_weather_data(raw_data)
@@ -224,103 +658,151 @@ RESPONSE STYLE:
             logger.info(f"Successfully fetched weather for {location}")
             return {"success": True, "data": cleaned_data}
             
-        except requests.Timeout:
+        except asyncio.TimeoutError:
             logger.error(f"Request timeout for location: {location}")
             return {"success": False, "error": "Request timed out"}
-        except requests.RequestException as e:
+        except aiohttp.ClientError as e:
             logger.error(f"Weather API request error: {e}")
             return {"success": False, "error": "Failed to fetch weather data"}
         except Exception as e:
             logger.error(f"Unexpected error fetching weather: {e}")
             return {"success": False, "error": "An unexpected error occurred"}
 
-    def _clean_weather_data(self, raw_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def _generate_conversational_response(
+        self,
+        user_query: str,
+        weather_data: Dict[str, Any]
+    ) -> str:
         """
-        Clean and structure raw weather API response to reduce token usage.
+        Generate a natural language response using LLM.
         
         Args:
-            raw_data: Raw JSON response from WeatherAPI.com.
+            user_query: Original user query.
+            weather_data: Cleaned weather data.
             
         Returns:
-            Cleaned and structured weather data.
+            Natural language response string.
         """
-        location_data = raw_data.get("location", {})
-        current_data = raw_data.get("current", {})
-        forecast_data = raw_data.get("forecast", {}).get("forecastday", [])
+        cache_key = self._response_key(user_query, weather_data)
+        cached = await _response_cache.aget(cache_key)
+        if cached is not None:
+            return cached
         
-        cleaned = {
-            "location": f"{location_data.get('name', 'Unknown')}, "
-                       f"{location_data.get('country', 'Unknown')}",
-            "local_time": location_data.get("localtime", "N/A"),
-            "current": {
-                "temp": f"{current_data.get('temp_c', 'N/A')}°C",
-                "feels_like": f"{current_data.get('feelslike_c', 'N/A')}°C",
-                "condition": current_data.get("condition", {}).get("text", "N/A"),
-                "wind": f"{current_data.get('wind_kph', 'N/A')} kph",
-                "wind_direction": current_data.get("wind_dir", "N/A"),
-                "humidity": f"{current_data.get('humidity', 'N/A')}%",
-                "cloud_cover": f"{current_data.get('cloud', 'N/A')}%",
-                "uv_index": current_data.get("uv", "N/A")
-            },
-            "forecast": []
-        }
-        
-        # Add forecast data
-        for day in forecast_data:
-            day_data = day.get("day", {})
-            cleaned["forecast"].append({
-                "date": day.get("date", "N/A"),
-                "max_temp": f"{day_data.get('maxtemp_c', 'N/A')}°C",
-                "min_temp": f"{day_data.get('mintemp_c', 'N/A')}°C",
-                "avg_temp": f"{day_data.get('avgtemp_c', 'N/A')}°C",
-                "condition": day_data.get("condition", {}).get("text", "N/A"),
-                "rain_chance": f"{day_data.get('daily_chance_of_rain', 'N/A')}%",
-                "max_wind": f"{day_data.get('maxwind_kph', 'N/A')} kph"
-            })
-        
-        return cleaned
-
-    def _generate_conversational_response(
+        try:
+            response = await self.openai_client.chat.completions.create(
+                model=self.LLM_MODEL,
+                messages=self._response_messages(user_query, weather_data)
+            )
+            
+            answer = response.choices[0].message.content
+            await _response_cache.aset(cache_key, answer)
+            return answer
+            
+        except Exception as e:
+            logger.error(f"Failed to generate conversational response: {e}")
+            # Fallback to basic response
+            return self._basic_response(weather_data)
+
+    async def _stream_conversational_response(
         self,
         user_query: str,
         weather_data: Dict[str, Any]
-    ) -> str:
+    ) -> AsyncIterator[str]:
         """
-        Generate a natural language response using LLM.
+        Streaming variant of _generate_conversational_response.
         
         Args:
             user_query: Original user query.
             weather_data: Cleaned weather data.
             
-        Returns:
-            Natural language response string.
+        Yields:
+            Response text fragments as the LLM produces them (a cached answer comes as one fragment).
         """
+        cache_key = self._response_key(user_query, weather_data)
+        cached = await _response_cache.aget(cache_key)
+        if cached is not None:
+            yield cached
+            return
+        
+        parts = []
         try:
-            prompt = (
-                f"User Query: {user_query}\n\n"
-                f"Weather Data: {json.dumps(weather_data, indent=2)}"
-            )
-            
-            response = self.openai_client.chat.completions.create(
+            stream = await self.openai_client.chat.completions.create(
                 model=self.LLM_MODEL,
-                messages=[
-                    {"role": "system", "content": self.RESPONSE_SYSTEM_PROMPT},
-                    {"role": "user", "content": prompt}
-                ]
+                messages=self._response_messages(user_query, weather_data),
+                stream=True
             )
             
-            return response.choices[0].message.content
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
             
+            await _response_cache.aset(cache_key, "".join(parts))
+                    
         except Exception as e:
-            logger.error(f"Failed to generate conversational response: {e}")
-            # Fallback to basic response
-            current = weather_data.get("current", {})
-            location = weather_data.get("location", "Unknown")
-            temp = current.get("temp", "N/A")
-            condition = current.get("condition", "N/A")
-            return f"Weather in {location}: {temp}, {condition}."
+            logger.error(f"Failed to stream conversational response: {e}")
+            # Fallback to basic response, unless part of the answer already went out
+            if not parts:
+                yield self._basic_response(weather_data)
 
-    def get_weather(self, user_query: str) -> str:
+    async def _prepare_weather(self, user_query: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        Run phases 1 and 2 (extraction + fetching) of a weather query.
+        
+        While the LLM extracts the city, the fetch for a regex-guessed city is already
+        running; if the LLM agrees, the wait is max(LLM, HTTP) instead of LLM + HTTP.
+        
+        Args:
+            user_query: Natural language query from user (already stripped).
+            
+        Returns:
+            Tuple of (weather_data, None) on success, or (None, user-facing error message).
+        """
+        # Phase 0: Simple queries skip the LLM; an unknown city still goes to the LLM for spelling correction
+        fast = self._fast_extract(user_query)
+        if fast:
+            weather_result = await self._fetch_raw_weather(*fast)
+            if weather_result.get("success"):
+                return weather_result["data"], None
+            if weather_result.get("error") != "City not found":
+                return None, self._fetch_error_message(fast[0], weather_result)
+        
+        guess = None if fast else self._quick_city_guess(user_query)
+        speculative = (
+            asyncio.create_task(self._fetch_raw_weather(guess, self.SPECULATIVE_DAYS))
+            if guess else None
+        )
+        
+        try:
+            # Phase 1: Extract location and days
+            try:
+                city, days = await self._extract_location_and_days(user_query)
+            except WeatherAPIError as e:
+                logger.error(f"Extraction failed: {e}")
+                return None, self.EXTRACTION_FAILED_MESSAGE
+            
+            # Validate city was extracted
+            if not city:
+                return None, self.NO_CITY_MESSAGE
+            
+            # Phase 2: Fetch weather data (reuse the speculative fetch if the guess was right)
+            if speculative and city.casefold() == guess.casefold() and days <= self.SPECULATIVE_DAYS:
+                weather_result = await speculative
+                if weather_result.get("success"):
+                    data = weather_result["data"]
+                    weather_result = {"success": True, "data": {**data, "forecast": data["forecast"][:days]}}
+            else:
+                weather_result = await self._fetch_raw_weather(city, days)
+            
+            if not weather_result.get("success"):
+                return None, self._fetch_error_message(city, weather_result)
+            
+            return weather_result["data"], None
+        finally:
+            if speculative and not speculative.done():
+                speculative.cancel()
+
+    async def get_weather(self, user_query: str) -> str:
         """
         Process a natural language weather query and return a response.
         
@@ -329,6 +811,10 @@ RESPONSE STYLE:
         2. Weather data fetching
         3. Natural language response generation
         
+        Identical queries (after trim + lowercase) arriving while one is still being
+        answered share its extraction, fetch and LLM response instead of running their own.
+        The shared pipeline is cancelled once every caller waiting on it has been cancelled.
+        
         Args:
             user_query: Natural language query from user.
             
@@ -336,57 +822,103 @@ RESPONSE STYLE:
             Natural language response string.
         """
         if not user_query or not user_query.strip():
-            return "Please ask me about the weather in a specific location."
+            return self.EMPTY_QUERY_MESSAGE
         
         user_query = user_query.strip()
         
-        # Phase 1: Extract location and days
-        try:
-            city, days = self._extract_location_and_days(user_query)
-        except WeatherAPIError as e:
-            logger.error(f"Extraction failed: {e}")
-            return "I'm having trouble understanding your query. Could you rephrase it?"
+        flight_key = query_key(user_query)
+        task = self._inflight_queries.get(flight_key)
+        if task is None:
+            task = asyncio.create_task(self._answer_query(user_query))
+            self._inflight_queries[flight_key] = task
+            task.add_done_callback(lambda done: self._forget_query(flight_key, done))
         
-        # Validate city was extracted
-        if not city:
-            return (
-                "I couldn't identify a city in your request. "
-                "Could you please specify the location? "
-                "For example: 'weather in London' or 'forecast for Paris'"
-            )
+        self._query_waiters[task] = self._query_waiters.get(task, 0) + 1
+        try:
+            # Shielded: one client disconnecting must not cancel the answer for the others
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._query_waiters[task] == 1 and not task.done():
+                # Last waiter gone: stop the pipeline, and let new callers start a fresh one
+                self._forget_query(flight_key, task)
+                task.cancel()
+            raise
+        finally:
+            self._query_waiters[task] -= 1
+            if not self._query_waiters[task]:
+                del self._query_waiters[task]
+
+    def _forget_query(self, flight_key: str, task: asyncio.Task) -> None:
+        if self._inflight_queries.get(flight_key) is task:
+            del self._inflight_queries[flight_key]
+
+    async def _answer_query(self, user_query: str) -> str:
+        """Phases 1-3 of get_weather for an already stripped, non-empty query."""
+        data, error_message = await self._prepare_weather(user_query)
+        if error_message:
+            return error_message
         
-        # Phase 2: Fetch weather data
-        weather_result = self._fetch_raw_weather(city, days)
+        # Phase 3: Generate conversational response
+        return await self._generate_conversational_response(user_query, data)
+
+    async def stream_weather(self, user_query: str) -> AsyncIterator[str]:
+        """
+        Same as get_weather, but yields the final answer token by token.
         
-        if not weather_result.get("success"):
-            error_msg = weather_result.get("error", "Unknown error")
+        Args:
+            user_query: Natural language query from user.
             
-            if "not found" in error_msg.lower():
-                return (
-                    f"I couldn't find weather data for '{city}'. "
-                    f"Please check the spelling or try a different location."
-                )
-            elif "authentication" in error_msg.lower() or "denied" in error_msg.lower():
-                return "I'm experiencing technical difficulties. Please try again later."
-            elif "timeout" in error_msg.lower():
-                return "The weather service is taking too long to respond. Please try again."
-            else:
-                return f"I encountered an issue: {error_msg}. Please try again."
+        Yields:
+            Response text fragments.
+        """
+        if not user_query or not user_query.strip():
+            yield self.EMPTY_QUERY_MESSAGE
+            return
         
-        # Phase 3: Generate conversational response
+        user_query = user_query.strip()
+        
+        data, error_message = await self._prepare_weather(user_query)
+        if error_message:
+            yield error_message
+            return
+        
+        # Phase 3: Stream conversational response
+        async for chunk in self._stream_conversational_response(user_query, data):
+            yield chunk
+
+
+class WeatherAPIClient:
+    """
+    Blocking wrapper around AsyncWeatherAPIClient for scripts and the command line.
+    
+    Runs the async client on a private event loop, so its HTTP session stays open
+    across calls. Do not use it from code that is already inside an event loop.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._client = AsyncWeatherAPIClient(*args, **kwargs)
+        self._loop = asyncio.new_event_loop()
+
+    def get_weather(self, user_query: str) -> str:
+        """Blocking version of AsyncWeatherAPIClient.get_weather."""
+        return self._loop.run_until_complete(self._client.get_weather(user_query))
+
+    def stream_weather(self, user_query: str) -> Iterator[str]:
+        """Blocking version of AsyncWeatherAPIClient.stream_weather."""
+        chunks = self._client.stream_weather(user_query)
         try:
-            response = self._generate_conversational_response(
-                user_query,
-                weather_result["data"]
-            )
-            return response
-        except Exception as e:
-            logger.error(f"Response generation failed: {e}")
-            # Return basic weather info as fallback
-            data = weather_result["data"]
-            location = data.get("location", "Unknown")
-            current = data.get("current", {})
-            return f"Weather in {location}: {current.get('temp', 'N/A')}, {current.get('condition', 'N/A')}."
+            while True:
+                try:
+                    yield self._loop.run_until_complete(chunks.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            self._loop.run_until_complete(chunks.aclose())
+
+    def close(self) -> None:
+        """Close the HTTP session and the private event loop."""
+        self._loop.run_until_complete(self._client.close())
+        self._loop.close()
 
 
 # Convenience function for simple usage
@@ -402,7 +934,10 @@ def get_weather_response(query: str) -> str:
     """
     try:
         client = WeatherAPIClient()
-        return client.get_weather(query)
+        try:
+            return client.get_weather(query)
+        finally:
+            client.close()
     except ValueError as e:
         logger.error(f"Configuration error: {e}")
         return "Weather service is not properly configured."
@@ -438,6 +973,8 @@ if __name__ == "__main__":
             print(f"{'='*60}")
             response = client.get_weather(query)
             print(f"Response: {response}")
+        
+        client.close()
             
     except ValueError as e:
         print(f"Configuration error: {e}")
@@ -1,10 +1,19 @@
-import requests
+import httpx
 import sys
+import uuid
 
 # Configuration
-API_URL = "http://localhost:8000/chat"
+API_BASE_URL = "http://localhost:8000"
+SESSION_ID = str(uuid.uuid4()) # Lets the backend remember the last city for this terminal only
+# Fail fast if the server is down, but never give up on a slow answer (LLM + weather retries can exceed 30s)
+REQUEST_TIMEOUT = httpx.Timeout(30, connect=5, read=None)
 
 def chat_loop():
+    # One client for the whole session: every turn reuses the same keep-alive connection
+    with httpx.Client(base_url=API_BASE_URL, http2=True, timeout=REQUEST_TIMEOUT) as client:
+        run_turns(client)
+
+def run_turns(client: httpx.Client):
     print("\n" + "="*50)
     print("🤖 TERMINAL WEATHER BOT (Connected to FastAPI)")
     print("   - Type 'quit' or 'exit' to stop.")
@@ -28,11 +37,11 @@ def chat_loop():
 
         # 2. Send to Backend
         try:
-            # We match the data model: {"query": "..."}
-            payload = {"query": user_input}
+            # We match the data model: {"query": "...", "session_id": "..."}
+            payload = {"query": user_input, "session_id": SESSION_ID}
             
             # Send POST request
-            response = requests.post(API_URL, json=payload)
+            response = client.post("/chat", json=payload)
             response.raise_for_status() # Raise error for 400/500 codes
 
             # 3. Parse Response
@@ -48,7 +57,7 @@ def chat_loop():
             else:
                 print(f"Bot: {bot_reply}")
 
-        except requests.exceptions.ConnectionError:
+        except httpx.ConnectError:
             print("❌ Error: Could not connect to backend. Is 'uvicorn' running?")
         except Exception as e:
             print(f"❌ Error: {e}")
@@ -1,21 +1,54 @@
 import os
-import time
-from google import genai
+import random
+import asyncio
 from dotenv import load_dotenv
 
 load_dotenv()
 
-def upload_and_create_store():
+# Indexing-status polling: exponential backoff with jitter (0.5s, 1s, 2s, 4s, then every 8s)
+POLL_INITIAL_DELAY = 0.5
+POLL_MAX_DELAY = 8.0
+
+async def index_file(client, store_name: str, docs_folder: str, file_name: str):
+    file_path = os.path.join(docs_folder, file_name)
+    print(f"Indexing {file_name}...")
+    
+    # Adding metadata helps the AI narrow down searches later
+    custom_metadata = [
+        {'key': 'category', 'string_value': 'climate_science'},
+        {'key': 'filename', 'string_value': file_name}
+    ]
+
+    operation = await client.aio.file_search_stores.upload_to_file_search_store(
+        file=file_path,  
+        file_search_store_name=store_name,
+        config={
+            'display_name': file_name,
+            'custom_metadata': custom_metadata # This is a retrieval "fine-tune"
+        }
+    )
+    # Wait for completion (other files keep uploading/indexing meanwhile).
+    # Short files finish on the first tick; jitter keeps parallel polls from lining up.
+    delay = POLL_INITIAL_DELAY
+    while not operation.done:
+        await asyncio.sleep(delay + random.uniform(0, delay * 0.1))
+        operation = await client.aio.operations.get(operation)
+        delay = min(delay * 2, POLL_MAX_DELAY)
+    print(f"✅ {file_name} Done!")
+
+async def upload_and_create_store():
     api_key = os.getenv("GEMINI_API_KEY")
     if not api_key:
         print("❌ Error: GEMINI_API_KEY not found in .env")
         return
 
+    # Imported here so a missing key fails fast without paying the google-genai import
+    from google import genai
     client = genai.Client(api_key=api_key)
 
     # 1. Create the Store
     print("📦 Creating File Search Store...")
-    file_search_store = client.file_search_stores.create(
+    file_search_store = await client.aio.file_search_stores.create(
         config={'display_name': 'weather_store_v2'}
     )
     print(f"✅ Store Created: {file_search_store.name}")
@@ -35,34 +68,19 @@ def upload_and_create_store():
         print(f"⚠️ No PDF files found in '{docs_folder}' folder.")
         return
 
-    # 3. Upload Files with Metadata (Optional Fine-tuning)
-    for file_name in files_to_upload:
-        file_path = os.path.join(docs_folder, file_name)
-        print(f"Indexing {file_name}...")
-        
-        # Adding metadata helps the AI narrow down searches later
-        custom_metadata = [
-            {'key': 'category', 'string_value': 'climate_science'},
-            {'key': 'filename', 'string_value': file_name}
-        ]
-
-        operation = client.file_search_stores.upload_to_file_search_store(
-            file=file_path,  
-            file_search_store_name=file_search_store.name,
-            config={
-                'display_name': file_name,
-                'custom_metadata': custom_metadata # This is a retrieval "fine-tune"
-            }
-        )
-        # Wait for completion
-        while not operation.done:
-            time.sleep(2)
-            operation = client.operations.get(operation)
-            print(".", end="", flush=True)
-        print(f" Done!")
+    # 3. Upload Files with Metadata (Optional Fine-tuning), all at once
+    await asyncio.gather(*(
+        index_file(client, file_search_store.name, docs_folder, file_name)
+        for file_name in files_to_upload
+    ))
 
     print("\n🎉 SUCCESS!")
     print(f"👉 Copy this to your .env file:\nGEMINI_STORE_ID={file_search_store.name}")
 
 if __name__ == "__main__":
-    upload_and_create_store()
\ No newline at end of file
+    try:
+        import uvloop  # Same event loop as the server; not available on Windows
+        run = uvloop.run
+    except ImportError:
+        run = asyncio.run
+    run(upload_and_create_store())
\ No newline at end of file